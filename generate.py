@@ -13,8 +13,12 @@
 # ///
 
 import argparse
+import concurrent.futures
 import datetime
+import functools
+import graphlib
 import logging
+import multiprocessing
 import operator
 import os.path
 import pathlib
@@ -27,7 +31,7 @@ import types
 import warnings
 import xml.etree.ElementTree as ET
 
-from collections.abc import Collection, Iterable, Mapping
+from collections.abc import Callable, Collection, Iterable, Mapping
 from typing import Any, Literal, NamedTuple, Self, Sequence
 
 import docutils.core
@@ -45,28 +49,32 @@ import rst2html5
 LOGGER = logging.getLogger(__name__)
 
 
-def mako_rich_traceback(
+def _exception_chain(exception: BaseException) -> list[BaseException]:
+    """Walk the exception chain in the same order as ``rich.traceback.Traceback.extract``."""
+    chain = []
+    current: BaseException | None = exception
+    while current is not None and current not in chain:
+        chain.append(current)
+        if current.__cause__ is not None:
+            current = current.__cause__
+        elif not current.__suppress_context__:
+            current = current.__context__
+        else:
+            current = None
+    return chain
+
+
+def mako_rich_trace(
     exception: BaseException,
     *,
-    # rich.traceback.Traceback.from_exception kwargs
-    width: int | None = 100,
-    code_width: int | None = 88,
-    extra_lines: int = 3,
-    theme: str | None = None,
-    word_wrap: bool = False,
+    # rich.traceback.Traceback.extract kwargs
     show_locals: bool = False,
     locals_max_length: int = rich.traceback.LOCALS_MAX_LENGTH,
     locals_max_string: int = rich.traceback.LOCALS_MAX_STRING,
     locals_hide_dunder: bool = True,
     locals_hide_sunder: bool = False,
-    indent_guides: bool = True,
-    suppress: Iterable[str | types.ModuleType] = (),
-    max_frames: int = 100,
-) -> rich.traceback.Traceback:
-    """Make a rich traceback with mako template information."""
-
-    if not exception:
-        exception = sys.exception()
+) -> rich.traceback.Trace:
+    """Extract a rich trace with mako template information."""
 
     rich_trace = rich.traceback.Traceback.extract(
         type(exception),
@@ -81,11 +89,10 @@ def mako_rich_traceback(
     )
 
     # Add missing mako information to the rich traceback.
-    stack_exception = exception
     # ``rich.traceback.Stack`` is an object containing the information for each
-    # exception in the chain (as-in walking the ``exception.__context__``
-    # attribute).
-    for rich_stack in reversed(rich_trace.stacks):
+    # exception in the chain (as-in walking the ``exception.__cause__`` and
+    # ``exception.__context__`` attributes), starting from the outermost one.
+    for rich_stack, stack_exception in zip(rich_trace.stacks, _exception_chain(exception)):
         mako_tb = mako.exceptions.RichTraceback(stack_exception, stack_exception.__traceback__)
         # ``rich.traceback.Frame`` is an object containing the frame information
         # needed to generate the traceback text for the user.
@@ -98,7 +105,48 @@ def mako_rich_traceback(
             else:
                 # if one is set, the other must be too
                 assert not template_filename or not template_lineno
-        stack_exception = stack_exception.__context__
+
+    return rich_trace
+
+
+def mako_rich_traceback(
+    exception: BaseException,
+    *,
+    # rich.traceback.Traceback.from_exception kwargs
+    width: int | None = 100,
+    code_width: int | None = 88,
+    extra_lines: int = 3,
+    theme: str | None = None,
+    word_wrap: bool = False,
+    show_locals: bool = False,
+    locals_max_length: int = rich.traceback.LOCALS_MAX_LENGTH,
+    locals_max_string: int = rich.traceback.LOCALS_MAX_STRING,
+    locals_hide_dunder: bool = True,
+    locals_hide_sunder: bool = False,
+    indent_guides: bool = True,
+    suppress: Iterable[str | types.ModuleType] = (),
+    max_frames: int = 100,
+) -> rich.traceback.Traceback:
+    """Make a rich traceback with mako template information.
+
+    For ``TaskError``, the trace extracted where the task ran is used instead, as the original
+    traceback is lost when the error is sent back from a worker process.
+    """
+
+    if not exception:
+        exception = sys.exception()
+
+    if isinstance(exception, TaskError):
+        rich_trace = exception.trace
+    else:
+        rich_trace = mako_rich_trace(
+            exception,
+            show_locals=show_locals,
+            locals_max_length=locals_max_length,
+            locals_max_string=locals_max_string,
+            locals_hide_dunder=locals_hide_dunder,
+            locals_hide_sunder=locals_hide_sunder,
+        )
 
     return rich.traceback.Traceback(
         rich_trace,
@@ -141,6 +189,14 @@ def main_parser() -> argparse.ArgumentParser:
         '-m',
         action='store_true',
     )
+    parser.add_argument(
+        '--only',
+        '-o',
+        type=str,
+        action='append',
+        metavar='TARGET',
+        help='only build the given task or output path (relative to outdir), and its dependencies',
+    )
     return parser
 
 
@@ -197,14 +253,16 @@ class Renderer:
 
     def __init__(
         self,
-        templates: mako.lookup.TemplateLookup,
+        template_lookup_args: dict[str, Any],
         outdir: pathlib.Path,
         content_root: pathlib.Path,
         minify: bool = True,
         base_render_args: dict[str, Any] = {},
     ) -> None:
         self.__logger = LOGGER.getChild(self.__class__.__name__)
-        self._templates = templates
+        # Keep the arguments around, so that the lookup can be re-created when unpickling.
+        self._template_lookup_args = template_lookup_args.copy()
+        self._templates = mako.lookup.TemplateLookup(**self._template_lookup_args)
         self._outdir = outdir
         self._content_root = content_root
         self._minify = minify
@@ -213,6 +271,20 @@ class Renderer:
 
         self._writer = rst2html5.HTML5Writer()
 
+    def __getstate__(self) -> dict[str, Any]:
+        # The template lookup and writer hold locks and compiled modules, so they can't be
+        # pickled. Drop them, and re-create them when unpickling, so that the renderer can be
+        # sent to worker processes.
+        state = self.__dict__.copy()
+        del state['_templates']
+        del state['_writer']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._templates = mako.lookup.TemplateLookup(**self._template_lookup_args)
+        self._writer = rst2html5.HTML5Writer()
+
     def _write_html(self, file: pathlib.Path, html: str) -> None:
         file.parent.mkdir(parents=True, exist_ok=True)
         self.__logger.info(f'writing to {file}')
@@ -359,15 +431,183 @@ class Section(NamedTuple):
         }
 
 
-def backwards_compatibility_fixes(renderer: Renderer, outdir: pathlib.Path) -> None:
-    renderer.render_redirect_page(
-        outdir / 'blog' / 'index.html',
-        outdir / 'posts' / 'index.html',
-    )
-    renderer.render_redirect_page(
-        outdir / 'blog' / '01-gsoc-2020' / 'index.html',
-        outdir / 'posts' / '01-gsoc-2020' / 'index.html',
+class Task(NamedTuple):
+    name: str
+    function: Callable[[], object]
+    inputs: Collection[pathlib.Path] = ()
+    outputs: Collection[pathlib.Path] = ()
+    # Where the task runs -- 'thread' for subprocess and I/O bound tasks, 'process' for CPU bound
+    # ones. Process tasks must be picklable.
+    executor: Literal['thread', 'process'] = 'thread'
+
+
+class TaskError(Exception):
+    """A build task failed.
+
+    Carries the rich trace of the original exception, with the mako template information, so that
+    it survives being pickled back from a worker process.
+    """
+
+    def __init__(self, task: str, trace: rich.traceback.Trace) -> None:
+        super().__init__(task, trace)
+        self.task = task
+        self.trace = trace
+
+    def __str__(self) -> str:
+        return f'task {self.task!r} failed'
+
+
+def _timed_call(name: str, function: Callable[[], object]) -> float:
+    start_timestamp = time.perf_counter()
+    try:
+        function()
+    except Exception as e:
+        raise TaskError(name, mako_rich_trace(e)) from None
+    return time.perf_counter() - start_timestamp
+
+
+class TaskGraph:
+    """Build tasks, with the dependencies between them inferred from their inputs and outputs.
+
+    A task depends on another if any of its inputs is (or is inside) one of the other's outputs.
+    """
+
+    def __init__(self, tasks: Iterable[Task]) -> None:
+        self.__logger = LOGGER.getChild(self.__class__.__name__)
+        self._tasks: dict[str, Task] = {}
+        self._producers: dict[pathlib.Path, str] = {}
+        for task in tasks:
+            if task.name in self._tasks:
+                raise ValueError(f'Duplicated task name: {task.name!r}')
+            self._tasks[task.name] = task
+            for output in task.outputs:
+                if output in self._producers:
+                    raise ValueError(
+                        f'Output {os.fspath(output)!r} is produced by both '
+                        f'{self._producers[output]!r} and {task.name!r}'
+                    )
+                self._producers[output] = task.name
+        # Tasks writing inside each other's output directories could race.
+        for output, name in self._producers.items():
+            for parent in output.parents:
+                if parent in self._producers and self._producers[parent] != name:
+                    raise ValueError(
+                        f'Output {os.fspath(output)!r} of {name!r} is inside output '
+                        f'{os.fspath(parent)!r} of {self._producers[parent]!r}'
+                    )
+        self._dependencies = {
+            task.name: {
+                producer
+                for path in task.inputs
+                if (producer := self.producer(path)) and producer != task.name
+            }
+            for task in self._tasks.values()
+        }
+        # Raises graphlib.CycleError if the dependencies are not a DAG.
+        graphlib.TopologicalSorter(self._dependencies).prepare()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+    def producer(self, path: pathlib.Path) -> str | None:
+        """Find the task that produces ``path``, or the directory containing it."""
+        for candidate in (path, *path.parents):
+            if candidate in self._producers:
+                return self._producers[candidate]
+        return None
+
+    def subgraph(self, targets: Iterable[str]) -> Self:
+        """Make a graph with only the ``targets`` tasks and their dependencies."""
+        selected = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack += self._dependencies[name]
+        return self.__class__(task for task in self._tasks.values() if task.name in selected)
+
+    def run(self) -> dict[str, float]:
+        """Run the tasks, concurrently where possible, and return how long each of them took."""
+        sorter = graphlib.TopologicalSorter(self._dependencies)
+        sorter.prepare()
+        durations: dict[str, float] = {}
+        with (
+            concurrent.futures.ThreadPoolExecutor() as threads,
+            # Worker processes may be started while thread tasks are running, so don't fork.
+            concurrent.futures.ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=setup_logging,
+            ) as processes,
+        ):
+            executors = {'thread': threads, 'process': processes}
+            pending: dict[concurrent.futures.Future[float], str] = {}
+            try:
+                while sorter.is_active():
+                    for name in sorter.get_ready():
+                        task = self._tasks[name]
+                        self.__logger.debug(f'starting {name!r} ({task.executor})')
+                        future = executors[task.executor].submit(_timed_call, name, task.function)
+                        pending[future] = name
+                    done, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        name = pending.pop(future)
+                        durations[name] = future.result()
+                        sorter.done(name)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        return durations
+
+    def critical_path(self, durations: Mapping[str, float]) -> list[str]:
+        """Find the longest chain of dependent tasks, given how long each of them took."""
+        # cost of the longest chain ending in each task, and the previous task in that chain
+        costs: dict[str, float] = {}
+        previous: dict[str, str | None] = {}
+        name: str | None
+        for name in graphlib.TopologicalSorter(self._dependencies).static_order():
+            dependency = max(self._dependencies[name], key=costs.__getitem__, default=None)
+            previous[name] = dependency
+            chain_cost = costs[dependency] if dependency is not None else 0
+            costs[name] = durations.get(name, 0) + chain_cost
+        path = []
+        name = max(costs, key=costs.__getitem__, default=None)
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1]
+
+
+def backwards_compatibility_tasks(renderer: Renderer, outdir: pathlib.Path) -> list[Task]:
+    redirects = [
+        ('blog/index.html', 'posts/index.html'),
+        ('blog/01-gsoc-2020/index.html', 'posts/01-gsoc-2020/index.html'),
+    ]
+    return [
+        Task(
+            name=f'redirect:{target}',
+            function=functools.partial(
+                renderer.render_redirect_page, outdir / origin, outdir / target
+            ),
+            inputs=[outdir / origin],
+            outputs=[outdir / target],
+        )
+        for origin, target in redirects
+    ]
+
+
+def copy_static_files(source: pathlib.Path, destination: pathlib.Path) -> None:
+    shutil.copytree(source, destination, dirs_exist_ok=True)
+
+
+def generate_pygments_css(outfile: pathlib.Path) -> None:
+    pygments_css = subprocess.check_output(
+        ['pygmentize', '-S', 'default', '-f', 'html', '-a', 'pre']
     )
+    outfile.write_bytes(pygments_css)
 
 
 def main(cli_args: Sequence[str]) -> None:
@@ -412,9 +652,8 @@ def main(cli_args: Sequence[str]) -> None:
         ),
     ]
 
-    templates = mako.lookup.TemplateLookup(directories=[root / 'templates'])
     renderer = Renderer(
-        templates,
+        {'directories': [root / 'templates']},
         outdir,
         content_root=content,
         minify=not args.skip_minify,
@@ -424,52 +663,102 @@ def main(cli_args: Sequence[str]) -> None:
         },
     )
 
-    # render
-    main_logger.debug('rendering HTML...')
-    renderer.render('index.html', content / 'index.rst')
+    tasks = [
+        Task(
+            name='index',
+            function=functools.partial(renderer.render, 'index.html', content / 'index.rst'),
+            inputs=[content / 'index.rst'],
+            outputs=[outdir / 'index.html'],
+            executor='process',
+        ),
+        Task(
+            name='pygments',
+            function=functools.partial(generate_pygments_css, out_css / 'pygments.css'),
+            outputs=[out_css / 'pygments.css'],
+        ),
+        Task(
+            name='sass',
+            function=functools.partial(
+                subprocess.check_call,
+                [
+                    'sass',
+                    '--style=compressed',
+                    f'-I{external!s}',
+                    os.fspath(root / 'scss' / 'style.scss'),
+                    os.fspath(out_css / 'style.css'),
+                ],
+            ),
+            inputs=[root / 'scss' / 'style.scss', external],
+            outputs=[out_css / 'style.css'],
+        ),
+        Task(
+            name='static',
+            function=functools.partial(copy_static_files, root / 'static', outdir / 'static'),
+            inputs=[root / 'static'],
+            # Declare the copied files, rather than the directory, as other tasks also write to it.
+            outputs=[
+                outdir / path.relative_to(root)
+                for path in root.joinpath('static').rglob('*')
+                if path.is_file()
+            ],
+        ),
+    ]
     for section in sections:
-        renderer.render(
-            template=section.index_template,
-            outfile=section.output_path / 'index.html',
-            render_args={
-                'title': section.title,
-                'pages': section.pages,
-            },
+        pages = section.pages
+        tasks.append(
+            Task(
+                name=section.output_path.as_posix(),
+                function=functools.partial(
+                    renderer.render,
+                    template=section.index_template,
+                    outfile=section.output_path / 'index.html',
+                    render_args={
+                        'title': section.title,
+                        'pages': pages,
+                    },
+                ),
+                inputs=list(pages.values()),
+                outputs=[outdir / section.output_path / 'index.html'],
+                executor='process',
+            )
         )
-        for file in section.pages.values():
-            renderer.render(
-                template=section.article_template,
-                content_file=file,
-                outfile=section.output_path / file.stem / 'index.html',
-                html_settings=section.content_html_settings,
+        for file in pages.values():
+            tasks.append(
+                Task(
+                    name=(section.output_path / file.stem).as_posix(),
+                    function=functools.partial(
+                        renderer.render,
+                        template=section.article_template,
+                        content_file=file,
+                        outfile=section.output_path / file.stem / 'index.html',
+                        html_settings=section.content_html_settings,
+                    ),
+                    inputs=[file],
+                    outputs=[outdir / section.output_path / file.stem / 'index.html'],
+                    executor='process',
+                )
             )
-
-    # generate pygments theme
-    main_logger.debug('generating pygments theme...')
-    pygments_css = subprocess.check_output(
-        ['pygmentize', '-S', 'default', '-f', 'html', '-a', 'pre']
-    )
-    out_css.joinpath('pygments.css').write_bytes(pygments_css)
-
-    # compile scss
-    main_logger.debug('compiling SASS stylecheats...')
-    subprocess.check_call(
-        [
-            'sass',
-            '--style=compressed',
-            f'-I{external!s}',
-            os.fspath(root / 'scss' / 'style.scss'),
-            os.fspath(out_css / 'style.css'),
-        ]
+    tasks += backwards_compatibility_tasks(renderer, outdir)
+
+    graph = TaskGraph(tasks)
+    if args.only:
+        targets = []
+        for target in args.only:
+            name = target if target in graph else graph.producer(outdir / target)
+            if not name:
+                parser.error(f'unknown target: {target!r}')
+            targets.append(name)
+        graph = graph.subgraph(targets)
+
+    main_logger.debug('running build tasks...')
+    durations = graph.run()
+
+    critical_path = graph.critical_path(durations)
+    main_logger.info(
+        f'Critical path ({sum(durations[name] for name in critical_path):04f}s): '
+        + ' -> '.join(f'{name} ({durations[name]:04f}s)' for name in critical_path)
     )
 
-    # copy static files
-    main_logger.debug('copying static files...')
-    shutil.copytree(root / 'static', outdir / 'static', dirs_exist_ok=True)
-
-    main_logger.debug('applying backwards compatibility fixes...')
-    backwards_compatibility_fixes(renderer, outdir)
-
     stop_timestamp = time.perf_counter()
 
     main_logger.info(
@@ -492,8 +781,12 @@ def excepthook(
     rich.print(mako_rich_traceback(value))
 
 
+def setup_logging() -> None:
+    logging.basicConfig(level=logging.INFO, handlers=[rich.logging.RichHandler()])
+
+
 if __name__ == '__main__':
     sys.excepthook = excepthook
-    logging.basicConfig(level=logging.INFO, handlers=[rich.logging.RichHandler()])
+    setup_logging()
 
     main(sys.argv[1:])